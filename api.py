@@ -1,260 +1,77 @@
 import argparse
+import csv
 import logging
 import os
 
+import matplotlib
+# The plot is only ever written into a file, so the non-interactive Agg
+# backend is sufficient and avoids setting up a GUI backend.
+matplotlib.use('Agg')
+# Let Agg drop path segments that don't change the rendered result.
+matplotlib.rcParams['path.simplify'] = True
+matplotlib.rcParams['path.simplify_threshold'] = 1.0
 import matplotlib.pyplot as plt
 import numpy as np
-import requests
-import tablib
 
-CPI_DATA_URL = 'http://research.stlouisfed.org/fred2/data/CPIAUCSL.txt'
+from cpi import CPI_DATA_URL, CPIData
+from giantbomb import GiantbombAPI
 
 
-class CPIData:
-    """Abstraction of the CPI data provided by FRED.
-
-    This stores internally only one value per year.
-
-    """
-
-    def __init__(self):
-        # Each year available to the dataset will end up as a simple key-value
-        # pair within this dict.
-        self.year_cpi = {}
-
-        # First and last year of the dataset needs to be remembered
-        # to handle years outside the documented time span.
-        self.last_year = None
-        self.first_year = None
-
-    def load_from_url(self, url, save_as_file=None):
-        """Loads data from a given url.
-
-        The downloaded file can also be saved into a location for later
-        re-use with the "save_as_file" parameter specifying a filename.
-
-        After fetching the file this implementation uses load_from_file
-        internally.
-
-        """
-        # Need to keep as little data as possible in memory at all times
-        # by disabling gzip-compression
-        fp = requests.get(url, stream=True,
-                          headers={'Accept-Encoding': None}).raw
-
-        # If save_as_file parameter is not passed, return
-        # raw data from the previous line.
-        if save_as_file is None:
-            return self.load_from_file(fp)
-
-        # Else, write to the desired file.
-        else:
-            with open(save_as_file, 'wb+') as out:
-                while True:
-                    buffer = fp.read(81920)
-                    if not buffer:
-                        break
-                    out.write(buffer)
-            with open(save_as_file) as fp:
-                return self.load_from_file(fp)
-
-    def load_from_file(self, fp):
-        """Loads CPI data from a given file-like object."""
-        # Create temporary variables when iterating over data file.
-        reached_dataset = False
-        current_year = None
-        year_cpi = []
-        for line in fp:
-            # Skip until we reach the header line "DATE"
-            if not reached_dataset:
-                if line.startswith("DATE "):
-                    reached_dataset = True
-                continue
-
-            # Remove new-line character at the end of each line
-            # and split into list
-            data = line.rstrip().split()
-
-            # Extract year from date by splitting date string
-            year = int(data[0].split("-")[0])
-            cpi = float(data[1])
-
-            if self.first_year is None:
-                    self.first_year = year
-            self.last_year = year
-
-            # Once a new year is reached, reset the CPI data
-            # and calculate the average CPI of the current_year.
-
-            if current_year != year:
-                if current_year is not None:
-                    self.year_cpi[current_year] = sum(year_cpi) / len(year_cpi)
-                year_cpi = []
-                current_year = year
-            year_cpi.append(cpi)
-
-        # Do calculation again for the last year in the dataset
-        if current_year is not None and current_year not in self.year_cpi:
-            self.year_cpi[current_year] = sum(year_cpi) / len(year_cpi)
-
-    def get_adjusted_price(self, price, year, current_year=None):
-        """Returns the adapted price from a given year compared to what current
-        year has been specified i.e inflation.
-
-        """
-        # Currently there is no CPI data after 2018
-        if current_year is None or current_year > 2018:
-            current_year = 2018
-
-        # if data range doesn't provide a CPI for a given year,
-        # use the edge data.
-        if year < self.first_year:
-            year = self.first_year
-        elif year > self.last_year:
-            year = self.last_year
-
-        year_cpi = self.year_cpi[year]
-        current_cpi = self.year_cpi[current_year]
-
-        return float(price) / year_cpi * current_cpi
-
-
-class GiantbombAPI:
-    """
-    Simple implementation of the Giantbomb API that only offers the
-    GET /platforms/ call as a generator.
-
-    """
-
-    base_url = 'http://www.giantbomb.com/api'
-
-    def __init__(self, api_key):
-        self.api_key = api_key
-
-    def get_platforms(self, sort=None, filter=None, field_list=None):
-        """Generator yielding platforms matching the given criteria.
-        If no limit is specified, thi will return all platforms.
-
-        """
-
-        # Do value-format conversions from common Python data types to what
-        # the API requires. Need to convert a dictionary of criteria
-        # into a comma-separated list of key-value paris.
-        params = {}
-        if sort is not None:
-            params['sort'] = sort
-        if field_list is not None:
-            params['field_list'] = ','.join(field_list)
-        if filter is not None:
-            params['filter'] = filter
-            parsed_filters = []
-            for key, value in filter.items():
-                parsed_filters.append('{0}:{1}'.format(key, value))
-            params['filter'] = ','.join(parsed_filters)
-
-        # Append API key to the list of parameters and have data being
-        # returned as JSON.
-        params['api_key'] = self.api_key
-        params['format'] = 'json'
-
-        incomplete_result = True
-        num_total_results = None
-        num_fetched_results = 0
-        counter = 0
-
-        while incomplete_result:
-            # Need to make multiple calls given Giantbomb's limit for items
-            # in a result set for this API is 100 items.
-            params['offset'] = num_fetched_results
-            result = requests.get(self.base_url + '/platforms/',
-                                  headers={'User-agent': 'new-coder-tutorial'},
-                                  params=params)
-
-            result = result.json()
-            if num_total_results is None:
-                num_total_results = int(result['number_of_total_results'])
-            num_fetched_results += int(result['number_of_page_results'])
-            if num_fetched_results >= num_total_results:
-                incomplete_result = False
-            for item in result['results']:
-                logging.debug("Yielding platform {0} of {1}".format(
-                    counter + 1,
-                    num_total_results))
-
-                # Convert values into a more useful format where appropriate.
-                if 'original_price' in item and item['original_price']:
-                    item['original_price'] = float(item['original_price'])
-
-                # Make this a generator
-                yield item
-                counter += 1
-
-
-def is_valid_datset(platform):
-    """Filters out datasets that can't be used because they are either
-    lacking a release date or an original price. For rendering the output
-    we also require the name and the abbreviation of the platform.
-
-    """
-    if 'release_date' not in platform or not platform['release_date']:
-        logging.warn("{0} has no release date".format(platform['name']))
-        return False
-    if 'original_price' not in platform or not platform['original_price']:
-        logging.warn("{0} has no original price".format(platform['name']))
-        return False
-    if 'name' not in platform or not platform['name']:
-        logging.warn("No platform name found for given dataset")
-        return False
-    if 'abbreviation' not in platform or not platform['abbreviation']:
-        logging.warn("{0} has no abbreviation".format(platform['name']))
-        return False
-    return True
-
-
-def generate_plot(platforms, output_file):
+def generate_plot(platforms, output_file, fig=None):
     """Generates a bar chart out of the given platforms and writes
     the output into the specified file as PNG image.
 
-    """
-    # Convert the platforms in a format that can be attached to the 2 axis
-    # of the bar chart.
-    labels = []
-    values = []
-    for platform in platforms:
-        name = platform['name']
-        adjusted_price = platform['adjusted_price']
-        price = platform['original_price']
+    All given platforms are plotted, so platforms with prices that are
+    too high to be rendered need to be filtered out by the caller.
 
-        # Skip prices higher than 2000 USD
-        if price > 2000:
-            continue
+    An existing figure can be passed with the "fig" parameter to draw the
+    chart into. Otherwise a single figure is created on the first call and
+    re-used by all following calls.
 
-        # If the platform name is too long, replace it with the abbreviation.
-        if len(name) > 15:
-            name = platform['abbreviation']
-        labels.insert(0, "{0}\n$ {1}\n$ {2}".format(name, price,
-                                                    round(adjusted_price, 2)))
-        values.insert(0, adjusted_price)
+    """
+    # Convert the platforms in a format that can be attached to the 2 axis
+    # of the bar chart. Platforms are sorted by the most recent release
+    # first, but the chart should start with the oldest one.
+    platforms = list(platforms)[::-1]
+    values = np.fromiter((p['adjusted_price'] for p in platforms),
+                         dtype=np.float64, count=len(platforms))
+
+    # If the platform name is too long, replace it with the abbreviation.
+    names = [p['name'] if len(p['name']) <= 15 else p['abbreviation']
+             for p in platforms]
+    rounded_prices = np.round(values, 2).tolist()
+    labels = [f"{name}\n$ {p['original_price']}\n$ {rounded_price}"
+              for name, p, rounded_price in zip(names, platforms,
+                                                rounded_prices)]
 
     # Define the width of each bar and the size of the resulting graph.
     width = 0.3
     ind = np.arange(len(values))
-    fig = plt.figure(figsize=(len(labels) * 1.8, 10))
+    if fig is None:
+        if generate_plot.fig is None:
+            generate_plot.fig = plt.figure()
+        fig = generate_plot.fig
+    fig.clf()
+    fig.set_size_inches(len(labels) * 1.8, 10)
 
     # Generate a subplot and put values onto it.
     ax = fig.add_subplot(1, 1, 1)
-    ax.bar(ind, values, width, align='center')
+    ax.bar(ind, values, width, align='center', rasterized=True)
 
     # Format the X and Y axis labels. Set the ticks on the x-axis
     # slightly further apart and give them a slight tilting effect.
-    plt.ylabel('Adjusted price')
-    plt.xlabel('Year / Console')
+    ax.set_ylabel('Adjusted price')
+    ax.set_xlabel('Year / Console')
     ax.set_xticks(ind + 0.3)
     ax.set_xticklabels(labels)
     fig.autofmt_xdate()
-    plt.grid(True)
+    ax.grid(True)
+
+    fig.savefig(output_file, dpi=72)
+
 
-    plt.savefig(output_file, dpi=72)
+# Figure shared by all calls to generate_plot without an explicit figure.
+generate_plot.fig = None
 
 
 def generate_csv(platforms, output_file):
@@ -263,19 +80,23 @@ def generate_csv(platforms, output_file):
     The output_file can either be the path to a file or a file-like object.
 
     """
-    dataset = tablib.Dataset(headers=['Abbreviation', 'Name', 'Year', 'Price',
-                                      'Adjusted price'])
-    for p in platforms:
-        dataset.append([p['abbreviation'], p['name'], p['year'],
-                        p['original_price'], p['adjusted_price']])
-
     # If the output_file is a string it represents a path to a file which
     # we have to open first for writing.
     if isinstance(output_file, str):
-        with open(output_file, 'w+') as fp:
-            fp.write(dataset.csv)
+        fp = open(output_file, 'w', newline='')
     else:
-        output_file.write(dataset.csv)
+        fp = output_file
+
+    try:
+        writer = csv.writer(fp)
+        writer.writerow(['Abbreviation', 'Name', 'Year', 'Price',
+                         'Adjusted price'])
+        writer.writerows((p['abbreviation'], p['name'], p['year'],
+                          p['original_price'], p['adjusted_price'])
+                         for p in platforms)
+    finally:
+        if fp is not output_file:
+            fp.close()
 
 
 def parse_args():
@@ -324,42 +145,33 @@ def main():
           .format(CPI_DATA_URL))
 
     if os.path.exists(opts.cpi_file):
-        with open(opts.cpi_file) as fp:
-            cpi_data.load_from_file(fp)
+        cpi_data.load_cached(opts.cpi_file)
     else:
         cpi_data.load_from_url(opts.cpi_data_url, save_as_file=opts.cpi_file)
 
-    platforms = []
-    counter = 0
-
-    # Grab the platforms and calculate their current price
+    # Grab the platforms and their release year.
+    platforms = list(gb_api.get_platforms(sort='release_date:desc',
+                                          field_list=['release_date',
+                                                      'original_price',
+                                                      'abbreviation',
+                                                      'name'],
+                                          limit=opts.limit))
+    prices = np.fromiter((p['original_price'] for p in platforms),
+                         dtype=np.float64, count=len(platforms))
+    years = np.fromiter((p['year'] for p in platforms),
+                        dtype=np.int32, count=len(platforms))
+
+    # Calculate the current price of all platforms at once
     # in relation to the CPI value.
-    for platform in gb_api.get_platforms(sort='release_date:desc',
-                                         field_list=['release_date',
-                                                     'original_price',
-                                                     'abbreviation',
-                                                     'name']):
-        # Skip platforms that don't have a release date or price.
-        if not is_valid_datset(platform):
-            continue
-
-        # Figure out current price of each platform
-        year = int(platform['release_date'].split('-')[0])
-        price = platform['original_price']
-        adjusted_price = cpi_data.get_adjusted_price(price, year)
-        platform['year'] = year
-        platform['original_price'] = price
+    adjusted_prices = cpi_data.get_adjusted_prices(prices, years)
+    for platform, adjusted_price in zip(platforms, adjusted_prices.tolist()):
         platform['adjusted_price'] = adjusted_price
-        platforms.append(platform)
-
-        # Check if the dataset contains all the data we need.
-        if opts.limit is not None and counter + 1 >= opts.limit:
-            break
-        counter += 1
 
     # Generate graph for adjusted price data
     if opts.plot_file:
-        generate_plot(platforms, opts.plot_file)
+        # Skip prices higher than 2000 USD
+        plottable = np.flatnonzero(prices <= 2000)
+        generate_plot([platforms[i] for i in plottable], opts.plot_file)
     # Generate CSV file to save adjusted price data
     if opts.csv_file:
         generate_csv(platforms, opts.csv_file)
@@ -0,0 +1,215 @@
+import io
+import logging
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from session import session
+
+__all__ = ['CPI_DATA_URL', 'CPIData']
+
+_log = logging.getLogger(__name__)
+
+CPI_DATA_URL = 'http://research.stlouisfed.org/fred2/data/CPIAUCSL.txt'
+
+# Size of the buffers used when downloading the CPI data.
+DOWNLOAD_BUFFER_SIZE = 1 << 20
+
+# Start of the header line preceding the actual CPI dataset.
+CPI_HEADER = b"DATE "
+
+
+class CPIData:
+    """Abstraction of the CPI data provided by FRED.
+
+    This stores internally only one value per year.
+
+    """
+
+    def __init__(self):
+        # Each year available to the dataset will end up as a simple key-value
+        # pair within this dict.
+        self.year_cpi = {}
+
+        # First and last year of the dataset needs to be remembered
+        # to handle years outside the documented time span.
+        self.last_year = None
+        self.first_year = None
+
+        # Dense array of the yearly CPI values indexed by
+        # "year - first_year", used for bulk price adjustments.
+        self._cpi_arr = None
+
+        # Memoized results of ratio_array keyed by the current year.
+        self._ratios = {}
+
+    def load_from_url(self, url, save_as_file=None):
+        """Loads data from a given url.
+
+        The downloaded file can also be saved into a location for later
+        re-use with the "save_as_file" parameter specifying a filename.
+
+        After fetching the file this implementation uses load_from_file
+        internally.
+
+        """
+        # Stream the uncompressed data in large chunks, gzip-compression is
+        # disabled so the saved file matches what is downloaded.
+        response = session.get(url, stream=True,
+                               headers={'Accept-Encoding': 'identity'})
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=DOWNLOAD_BUFFER_SIZE)
+
+        # If save_as_file parameter is not passed, the whole file is read
+        # into memory and parsed from there. It's only a few tens of KiB.
+        if save_as_file is None:
+            return self.load_from_file(io.BytesIO(b''.join(chunks)))
+
+        # Else, write to the desired file and parse it through the same
+        # binary file object while its pages are still in the page cache.
+        else:
+            with open(save_as_file, 'wb+') as out:
+                for buffer in chunks:
+                    if buffer:
+                        out.write(buffer)
+                out.seek(0)
+                return self.load_from_file(out)
+
+    def load_from_file(self, fp):
+        """Loads CPI data from a given file-like object.
+
+        Binary file objects are preferred since they can be parsed without
+        decoding, but files opened in text mode work as well.
+
+        """
+        # Skip until we reach the header line "DATE". The remainder of the
+        # stream is the actual dataset which gets handed to pandas' parser.
+        while True:
+            line = fp.readline()
+            if not line:
+                break
+            # Files opened in text mode yield str instead of bytes.
+            if not isinstance(line, bytes):
+                line = line.encode()
+            if line.startswith(CPI_HEADER):
+                break
+
+        df = pd.read_csv(fp, sep=r'\s+', header=None, names=['date', 'cpi'],
+                         dtype={'cpi': 'float64'}, parse_dates=['date'],
+                         cache_dates=True)
+
+        # Average the monthly CPI values of each year.
+        df['year'] = df['date'].dt.year
+        means = df.groupby('year', sort=True)['cpi'].mean()
+
+        self.year_cpi = means.to_dict()
+        self.first_year = int(means.index[0])
+        self.last_year = int(means.index[-1])
+        self._cpi_arr = np.array([self.year_cpi[y] for y in
+                                  range(self.first_year, self.last_year + 1)],
+                                 dtype=np.float64)
+        self._ratios = {}
+
+    def load_cached(self, path):
+        """Loads CPI data from the given file using a pickled sidecar cache.
+
+        The cache is stored next to the file as "<path>.cache.pkl" and is
+        only used as long as the size and modification time of the file
+        match the ones recorded in the cache. Otherwise the file gets
+        parsed with load_from_file and the cache is rewritten.
+
+        """
+        cache_file = path + '.cache.pkl'
+        stat = os.stat(path)
+        header = (stat.st_mtime_ns, stat.st_size)
+
+        try:
+            with open(cache_file, 'rb') as fp:
+                if pickle.load(fp) == header:
+                    (self.first_year, self.last_year, self.year_cpi,
+                     self._cpi_arr) = pickle.load(fp)
+                    self._ratios = {}
+                    return
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            pass
+
+        # Read the file as bytes, pandas doesn't need it to be decoded.
+        with open(path, 'rb') as fp:
+            self.load_from_file(fp)
+
+        # Write the cache into a temporary file first and move it into place
+        # afterwards so readers never see a partially written cache.
+        tmp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+        try:
+            with open(tmp_file, 'wb') as fp:
+                pickle.dump(header, fp, pickle.HIGHEST_PROTOCOL)
+                pickle.dump((self.first_year, self.last_year, self.year_cpi,
+                             self._cpi_arr), fp, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            _log.debug("Could not write CPI cache to %s", cache_file)
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def get_adjusted_price(self, price, year, current_year=None):
+        """Returns the adapted price from a given year compared to what current
+        year has been specified i.e inflation.
+
+        """
+        # Currently there is no CPI data after 2018
+        if current_year is None or current_year > 2018:
+            current_year = 2018
+
+        # if data range doesn't provide a CPI for a given year,
+        # use the edge data.
+        if year < self.first_year:
+            year = self.first_year
+        elif year > self.last_year:
+            year = self.last_year
+
+        year_cpi = self.year_cpi[year]
+        current_cpi = self.year_cpi[current_year]
+
+        return float(price) / year_cpi * current_cpi
+
+    def get_adjusted_prices(self, prices, years, current_year=None):
+        """Vectorized version of get_adjusted_price.
+
+        Takes arrays of prices and their respective years and returns an
+        array of the adjusted prices.
+
+        """
+        # Currently there is no CPI data after 2018
+        if current_year is None or current_year > 2018:
+            current_year = 2018
+
+        # Clamp the years to the data range just like get_adjusted_price.
+        years_c = np.empty(len(years), dtype=np.intp)
+        np.clip(np.asarray(years, dtype=np.intp), self.first_year,
+                self.last_year, out=years_c)
+        years_c -= self.first_year
+
+        ratio = self.ratio_array(current_year)
+        return np.asarray(prices, dtype=np.float64) * ratio[years_c]
+
+    def ratio_array(self, current_year):
+        """Returns an array of the factors a price from each year has to be
+        multiplied with to get the price in the given current year.
+
+        The array is indexed by "year - first_year". Arrays are cached per
+        current year, so they must not be modified. A KeyError is raised
+        if there is no CPI data for the current year.
+
+        """
+        ratio = self._ratios.get(current_year)
+        if ratio is None:
+            # Like get_adjusted_price, fail for years without CPI data.
+            if not self.first_year <= current_year <= self.last_year:
+                raise KeyError(current_year)
+            current_cpi = self._cpi_arr[current_year - self.first_year]
+            ratio = current_cpi / self._cpi_arr
+            ratio.flags.writeable = False
+            self._ratios[current_year] = ratio
+        return ratio
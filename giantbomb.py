@@ -0,0 +1,198 @@
+import collections
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from session import session
+
+# Prefer the faster JSON parsers when they're available.
+try:
+    import orjson as json
+except ImportError:
+    try:
+        import ujson as json
+    except ImportError:
+        import json
+
+__all__ = ['GiantbombAPI', 'is_valid_datset']
+
+_log = logging.getLogger(__name__)
+
+
+class GiantbombAPI:
+    """
+    Simple implementation of the Giantbomb API that only offers the
+    GET /platforms/ call as a generator.
+
+    """
+
+    base_url = 'http://www.giantbomb.com/api'
+
+    # Giantbomb's limit for items in a result set for this API is 100 items.
+    page_size = 100
+
+    # Number of pages that are fetched concurrently. This matches the
+    # connection pool size of the shared session.
+    max_workers = 8
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def _get_page(self, params, offset, limit):
+        """Fetches a single page of at most "limit" platforms starting at the
+        given offset.
+
+        """
+        result = session.get(
+            self.base_url + '/platforms/',
+            headers={'User-agent': 'new-coder-tutorial'},
+            params=dict(params, offset=offset, limit=limit))
+        result.raise_for_status()
+        return json.loads(result.content)
+
+    def get_platforms(self, sort=None, filter=None, field_list=None,
+                      limit=None, validate=True):
+        """Generator yielding platforms matching the given criteria.
+        If no limit is specified, thi will return all platforms.
+
+        With "validate" enabled only platforms passing is_valid_datset are
+        yielded and each of them gets its release year attached as "year".
+
+        """
+
+        # Do value-format conversions from common Python data types to what
+        # the API requires. Need to convert a dictionary of criteria
+        # into a comma-separated list of key-value paris.
+        params = {}
+        if sort is not None:
+            params['sort'] = sort
+        if field_list is not None:
+            params['field_list'] = ','.join(field_list)
+        if filter is not None:
+            params['filter'] = filter
+            parsed_filters = []
+            for key, value in filter.items():
+                parsed_filters.append('{0}:{1}'.format(key, value))
+            params['filter'] = ','.join(parsed_filters)
+
+        # Append API key to the list of parameters and have data being
+        # returned as JSON.
+        params['api_key'] = self.api_key
+        params['format'] = 'json'
+
+        if limit is not None and limit <= 0:
+            return
+
+        # Never ask for more pages than could still be consumed. This
+        # assumes every remaining item is valid, so further pages are only
+        # requested once invalid items have actually been skipped. Pages
+        # are only shortened if no items will be skipped at all, since
+        # many short pages would cost more round-trips than they save.
+        def page_limit(num_requested):
+            if limit is None:
+                return page_size
+            num_missing = limit - counter - num_requested
+            if validate:
+                return page_size if num_missing > 0 else 0
+            return min(page_size, num_missing)
+
+        # The first page tells us how many results there are in total.
+        # The following offsets are always based on the number of results
+        # the server actually returned, it may send fewer than requested.
+        counter = 0
+        page_size = self.page_size
+        page = page_limit(0)
+        result = self._get_page(params, 0, page)
+        num_total_results = int(result['number_of_total_results'])
+        offset = int(result['number_of_page_results'])
+        if 0 < offset < min(page, num_total_results):
+            page_size = offset
+
+        # Need to make multiple calls given the page size limit. Up to
+        # max_workers pages are fetched concurrently but yielded in order.
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = collections.deque()
+        num_pending = 0
+        try:
+            while True:
+                for item in result['results']:
+                    # Convert values into a more useful format where
+                    # appropriate. This happens before validation so a
+                    # price of "0.00" counts as missing.
+                    price = item.get('original_price')
+                    if price and not isinstance(price, float):
+                        item['original_price'] = float(price)
+
+                    # Skip platforms that don't have a release date or price.
+                    if validate:
+                        if not is_valid_datset(item):
+                            continue
+                        item['year'] = int(item['release_date'][:4])
+
+                    _log.debug("Yielding platform %d of %d", counter + 1,
+                               num_total_results)
+
+                    # Make this a generator
+                    yield item
+                    counter += 1
+
+                    # Stop once enough platforms have been yielded.
+                    if limit is not None and counter >= limit:
+                        return
+
+                # Queue up the following pages.
+                while (len(pending) < self.max_workers and
+                       offset < num_total_results and
+                       page_limit(num_pending) > 0):
+                    page = page_limit(num_pending)
+                    pending.append((executor.submit(self._get_page, params,
+                                                    offset, page),
+                                    offset, page))
+                    offset += page
+                    num_pending += page
+
+                if not pending:
+                    return
+                future, page_offset, page = pending.popleft()
+                num_pending -= page
+                result = future.result()
+
+                # If the server sent a short page, the pages requested after
+                # it start at the wrong offset. Drop them and continue right
+                # after the items that were actually returned.
+                num_results = int(result['number_of_page_results'])
+                end = page_offset + num_results
+                if num_results < page and end < num_total_results:
+                    if not num_results:
+                        raise ValueError("Giantbomb returned an empty page "
+                                         "at offset {0}".format(page_offset))
+                    for future, _, _ in pending:
+                        future.cancel()
+                    pending.clear()
+                    num_pending = 0
+                    offset = end
+        finally:
+            # Don't wait for pages that are no longer needed.
+            for future, _, _ in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+def is_valid_datset(platform):
+    """Filters out datasets that can't be used because they are either
+    lacking a release date or an original price. For rendering the output
+    we also require the name and the abbreviation of the platform.
+
+    """
+    if 'release_date' not in platform or not platform['release_date']:
+        _log.warning("%s has no release date", platform['name'])
+        return False
+    if 'original_price' not in platform or not platform['original_price']:
+        _log.warning("%s has no original price", platform['name'])
+        return False
+    if 'name' not in platform or not platform['name']:
+        _log.warning("No platform name found for given dataset")
+        return False
+    if 'abbreviation' not in platform or not platform['abbreviation']:
+        _log.warning("%s has no abbreviation", platform['name'])
+        return False
+    return True
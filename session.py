@@ -0,0 +1,14 @@
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+__all__ = ['session']
+
+# Session shared by all HTTP calls so connections are kept alive and
+# re-used. Transient server errors are retried a few times.
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                       max_retries=Retry(total=3, backoff_factor=0.2,
+                                         status_forcelist=[502, 503, 504]))
+session.mount('http://', _adapter)
+session.mount('https://', _adapter)